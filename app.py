@@ -1,9 +1,25 @@
+import copy
+import hashlib
+import re
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+import pyarrow as pa
+import altair as alt
 from prophet import Prophet
 
+from loading import filter_categories, is_datetime_column, list_categories, read_header, read_sales_table
+from metrics import mape_pct
+
+# Column-name hints for the default date / sales mapping
+DATE_COL_PATTERN = re.compile(r"date|time", re.IGNORECASE)
+SALES_COL_PATTERN = re.compile(r"sale|rev", re.IGNORECASE)
+
+# Copy-on-write: column assignments copy only the touched column, never the whole frame.
+# Always on from pandas 3, where the option is deprecated, so only opt in on 2.x.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
 # --------------------------------------------------
 # Page Configuration
 # --------------------------------------------------
@@ -16,23 +32,161 @@ st.set_page_config(
 st.title("🚀 Retail Sales Forecaster")
 st.markdown("Upload any sales CSV. This app automatically detects your data structure.")
 
+# --------------------------------------------------
+# Cached Pipeline Stages
+# --------------------------------------------------
+# Every stage is keyed on the upload's content hash; the leading-underscore
+# arguments carry the data itself and are skipped by Streamlit's hasher.
+# Caches are shared by all sessions, so each one is bounded by entry count and age.
+CACHE_TTL = "1h"
+
+
+def upload_key(uploaded_file):
+    """Content hash of the upload, computed once per uploaded file."""
+    if st.session_state.get("upload_id") != uploaded_file.file_id:
+        st.session_state["upload_id"] = uploaded_file.file_id
+        # Hash the upload's buffer in place rather than a bytes copy of it
+        with uploaded_file.getbuffer() as view:
+            st.session_state["upload_key"] = hashlib.blake2b(view, digest_size=16).hexdigest()
+    return st.session_state["upload_key"]
+
+
+@st.cache_data(show_spinner=False, max_entries=8, ttl=CACHE_TTL)
+def read_columns(_uploaded_file, file_key):
+    """Column names from the CSV header."""
+    return read_header(pa.BufferReader(pa.py_buffer(_uploaded_file.getbuffer())))
+
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=CACHE_TTL)
+def load_csv(_uploaded_file, file_key, usecols, sales_col, cat_col):
+    """Parse the uploaded bytes once per file and column selection."""
+    # Arrow reads straight from the upload's memory; no intermediate bytes copy
+    source = pa.BufferReader(pa.py_buffer(_uploaded_file.getbuffer()))
+    names = read_columns(_uploaded_file, file_key)
+    return read_sales_table(source, names, list(usecols), sales_col, cat_col)
+
+
+@st.cache_data(show_spinner=False, max_entries=16, ttl=CACHE_TTL)
+def build_monthly_series(_table, file_key, date_col, sales_col, cat_col, selected_cat):
+    """Filter, clean and aggregate to the monthly ds/y frame Prophet expects."""
+    table = _table
+    if selected_cat:
+        table = filter_categories(table, cat_col, selected_cat)
+
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    # The reader already parses well-formed dates; only coerce what it left as text
+    if not is_datetime_column(df[date_col]):
+        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+    df = df.dropna(subset=[date_col, sales_col])
+
+    # Aggregate to Monthly on an int64-backed month key instead of Period objects
+    month_key = df[date_col].to_numpy("datetime64[ns]").astype("datetime64[M]")
+    # Sort the handful of months after aggregating rather than the rows before it
+    monthly_sales = (
+        df.groupby(month_key, sort=False, observed=True)[sales_col].sum()
+        .sort_index().rename_axis(date_col).reset_index()
+    )
+    monthly_sales[date_col] = monthly_sales[date_col].astype("datetime64[ns]")
+
+    # Prepare for Prophet as a fresh frame of contiguous NumPy columns (already sorted by month)
+    df_prophet = pd.DataFrame({
+        "ds": monthly_sales[date_col].to_numpy("datetime64[ns]"),
+        "y": monthly_sales[sales_col].to_numpy(np.float32),
+    })
+    assert df_prophet["ds"].is_monotonic_increasing
+    return df_prophet
+
+
+@st.cache_resource(show_spinner="🔮 Fitting model...", max_entries=8, ttl=CACHE_TTL)
+def fit_prophet(_df_prophet, series_key):
+    """Fit Prophet once per monthly series; the horizon only affects prediction."""
+    # Monthly buckets carry no daily/weekly signal, and holiday peaks are absorbed by
+    # the yearly seasonality, so no holiday regressors; 200 CI samples keep predict cheap
+    model = Prophet(yearly_seasonality=True, weekly_seasonality=False, daily_seasonality=False,
+                    interval_width=0.95, uncertainty_samples=200)
+    model.fit(_df_prophet)
+    return model
+
+
+def without_uncertainty(model):
+    """Shallow copy that predicts without interval sampling; the shared cached model is untouched."""
+    model = copy.copy(model)
+    model.uncertainty_samples = 0
+    return model
+
+
+@st.cache_data(show_spinner=False, max_entries=8, ttl=CACHE_TTL)
+def predict_fitted(_model, series_key):
+    """In-sample yhat for the accuracy metrics."""
+    model = without_uncertainty(_model)
+    return np.array(model.predict(model.history[["ds"]])["yhat"], dtype=np.float64)
+
+
+@st.cache_data(show_spinner="🔮 Generating Forecast...", max_entries=32, ttl=CACHE_TTL)
+def predict_forecast(_model, forecast_key, want_ci, include_history):
+    """Forecast for the horizon in forecast_key; skips interval sampling when no view shows it."""
+    model = _model if want_ci else without_uncertainty(_model)
+    future = model.make_future_dataframe(periods=forecast_key[-1], freq="MS", include_history=include_history)
+    return model.predict(future)
+
+
+# --------------------------------------------------
+# Chart Builders
+# --------------------------------------------------
+@st.cache_data(show_spinner=False, max_entries=32, ttl=CACHE_TTL)
+def make_forecast_chart(_forecast, _df_prophet, forecast_key):
+    """Forecast line with its confidence band, overlaid on the monthly actuals."""
+    base = alt.Chart(_forecast).encode(x=alt.X("ds:T", title="Date"))
+    band = base.mark_area(opacity=0.2).encode(
+        y=alt.Y("yhat_lower:Q", title="Sales"), y2="yhat_upper:Q"
+    )
+    line = base.mark_line().encode(y="yhat:Q")
+    actuals = alt.Chart(_df_prophet).mark_circle(color="black", size=20).encode(x="ds:T", y="y:Q")
+    return band + line + actuals
+
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=CACHE_TTL)
+def make_components_chart(_forecast, forecast_key):
+    """Stacked trend / yearly panels read straight from the forecast frame."""
+    components = ["trend", "yearly"]
+    panels = [
+        alt.Chart(_forecast[["ds", c]]).mark_line().encode(
+            x=alt.X("ds:T", title="Date"), y=alt.Y(f"{c}:Q", title=c.capitalize())
+        ).properties(height=200)
+        for c in components
+    ]
+    return alt.vconcat(*panels)
+
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=CACHE_TTL)
+def format_forecast_table(_res_table, forecast_key):
+    """Styled HTML for the forecast table, rendered once per series and horizon."""
+    styler = _res_table.style.format("${:,.0f}", subset=['Forecast', 'Lower Bound', 'Upper Bound'])
+    return styler.format("{:%Y-%m-%d}", subset=['Date']).hide(axis="index").to_html()
+
+
 # --------------------------------------------------
 # File Upload & Flexible Data Loading
 # --------------------------------------------------
 uploaded_file = st.file_uploader("📂 Upload CSV File", type=["csv"])
 
 if uploaded_file:
-    # Load raw data
-    raw_df = pd.read_csv(uploaded_file, encoding="latin1")
-    all_cols = raw_df.columns.tolist()
+    file_key = upload_key(uploaded_file)
+
+    # Read just the header so the column pickers can be populated
+    try:
+        all_cols = read_columns(uploaded_file, file_key)
+    except (pa.ArrowInvalid, ValueError) as e:
+        st.error(f"Could not read the CSV header: {e}")
+        st.stop()
 
     # --- Sidebar: Dynamic Mapping ---
     st.sidebar.header("🛠 Configuration")
     
     st.sidebar.subheader("Column Mapping")
     # Smart default detection
-    def_date = next((c for c in all_cols if 'date' in c.lower() or 'time' in c.lower()), all_cols[0])
-    def_sales = next((c for c in all_cols if 'sale' in c.lower() or 'rev' in c.lower()), all_cols[-1])
+    def_date = next((c for c in all_cols if DATE_COL_PATTERN.search(c)), all_cols[0])
+    def_sales = next((c for c in all_cols if SALES_COL_PATTERN.search(c)), all_cols[-1])
     
     date_col = st.sidebar.selectbox("Date Column", all_cols, index=all_cols.index(def_date))
     sales_col = st.sidebar.selectbox("Sales Column", all_cols, index=all_cols.index(def_sales))
@@ -40,36 +194,41 @@ if uploaded_file:
     # Optional Category Filter
     cat_col = st.sidebar.selectbox("Category Column (Optional)", ["None"] + all_cols)
 
+    # Load only the mapped columns so unused ones are never materialized
+    usecols = list(dict.fromkeys([date_col, sales_col] + ([cat_col] if cat_col != "None" else [])))
+    # The category is parsed as dictionary codes unless it doubles as the date or sales column
+    dict_col = cat_col if cat_col not in ("None", date_col, sales_col) else None
+    try:
+        table = load_csv(uploaded_file, file_key, tuple(usecols), sales_col, dict_col)
+    except (pa.ArrowInvalid, ValueError) as e:
+        # e.g. rows with extra fields, or a sales column that isn't numeric
+        st.error(f"Could not parse the selected columns: {e}")
+        st.stop()
+
     # --- Data Cleaning & Filtering ---
-    df = raw_df.copy()
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df = df.dropna(subset=[date_col, sales_col])
-    
+    selected_cat = []
     if cat_col != "None":
-        unique_cats = df[cat_col].unique().tolist()
+        unique_cats = list_categories(table, cat_col)
         selected_cat = st.sidebar.multiselect("Filter by Category", unique_cats)
-        if selected_cat:
-            df = df[df[cat_col].isin(selected_cat)]
 
-    # Aggregate to Monthly
-    monthly_sales = df.groupby(df[date_col].dt.to_period("M"))[sales_col].sum().reset_index()
-    monthly_sales[date_col] = monthly_sales[date_col].dt.to_timestamp()
-    
-    # Prepare for Prophet
-    df_prophet = monthly_sales.rename(columns={date_col: "ds", sales_col: "y"})
+    series_key = (file_key, date_col, sales_col, cat_col, tuple(selected_cat))
+    df_prophet = build_monthly_series(table, *series_key)
 
     # --------------------------------------------------
     # Forecasting Logic
     # --------------------------------------------------
     forecast_horizon = st.sidebar.slider("Forecast Horizon (Months)", 3, 24, 6)
     
-    model = Prophet(yearly_seasonality=True, interval_width=0.95)
-    model.add_country_holidays(country_name='US') # Adds Holiday Effects
-    
-    with st.spinner("🔮 Generating Forecast..."):
-        model.fit(df_prophet)
-        future = model.make_future_dataframe(periods=forecast_horizon, freq="MS")
-        forecast = model.predict(future)
+    forecast_key = series_key + (forecast_horizon,)
+
+    # Only the open tab is rendered, so intervals are sampled only when it shows them
+    views = ["📊 Forecast Plot", "🔍 Trend Analysis", "📥 Export Data"]
+    view = st.session_state.get("view", views[0])
+
+    # Fitted once per series; moving the horizon slider only re-runs predict
+    model = fit_prophet(df_prophet, series_key)
+    # Only the plots need the in-sample rows; the export table predicts just the horizon
+    forecast = predict_forecast(model, forecast_key, view != "🔍 Trend Analysis", view != "📥 Export Data")
 
     # --------------------------------------------------
     # Results & Visualization
@@ -77,33 +236,33 @@ if uploaded_file:
     # 1. Executive Metrics
     st.subheader("📌 Performance Summary")
     actuals = df_prophet['y']
-    preds = forecast.iloc[:len(df_prophet)]['yhat']
-    mape = np.mean(np.abs((actuals - preds) / actuals)) * 100
+    mape = mape_pct(actuals.to_numpy(np.float64), predict_fitted(model, series_key))
     
     m1, m2, m3 = st.columns(3)
     m1.metric("Average Monthly Sales", f"${actuals.mean():,.0f}")
-    m2.metric("Model Accuracy", f"{100-mape:.1f}%")
+    m2.metric("Model Accuracy", "n/a" if np.isnan(mape) else f"{100-mape:.1f}%")
     m3.metric("Projected Total (Forecast Period)", f"${forecast['yhat'].tail(forecast_horizon).sum():,.0f}")
 
-    # 2. Tabs for visualization
-    tab1, tab2, tab3 = st.tabs(["📊 Forecast Plot", "🔍 Trend Analysis", "📥 Export Data"])
+    # 2. Tabs for visualization; switching tabs reruns and only the open one is drawn
+    tab1, tab2, tab3 = st.tabs(views, key="view", on_change="rerun")
     
     with tab1:
-        fig1 = model.plot(forecast)
-        st.pyplot(fig1)
+        if tab1.open:
+            st.altair_chart(make_forecast_chart(forecast, df_prophet, forecast_key), width="stretch")
         
     with tab2:
-        fig2 = model.plot_components(forecast)
-        st.pyplot(fig2)
+        if tab2.open:
+            st.altair_chart(make_components_chart(forecast, forecast_key), width="stretch")
         
     with tab3:
-        # Prepare table
-        res_table = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(forecast_horizon)
-        res_table.columns = ['Date', 'Forecast', 'Lower Bound', 'Upper Bound']
-        st.dataframe(res_table.style.format("${:,.0f}", subset=['Forecast', 'Lower Bound', 'Upper Bound']))
-        
-        csv = res_table.to_csv(index=False).encode('utf-8')
-        st.download_button("Download Forecast CSV", data=csv, file_name="forecast.csv", mime="text/csv")
+        if tab3.open:
+            # Prepare table
+            res_table = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(forecast_horizon)
+            res_table.columns = ['Date', 'Forecast', 'Lower Bound', 'Upper Bound']
+            st.markdown(format_forecast_table(res_table, forecast_key), unsafe_allow_html=True)
+            
+            csv = res_table.to_csv(index=False).encode('utf-8')
+            st.download_button("Download Forecast CSV", data=csv, file_name="forecast.csv", mime="text/csv")
 
 else:
     st.info("Please upload a CSV file to begin.")
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""CSV parsing and category handling on Arrow tables, shared by the app and its tests."""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+
+def read_header(source):
+    """Header names from Arrow's reader, with blanks and duplicates renamed the way pandas does."""
+    # Ragged rows don't matter here; only the header is needed
+    reader = pacsv.open_csv(source, read_options=pacsv.ReadOptions(encoding="latin1", block_size=1 << 20),
+                            parse_options=pacsv.ParseOptions(invalid_row_handler=lambda row: "skip"))
+    names, seen = [], set()
+    for i, name in enumerate(reader.schema.names):
+        name = name or f"Unnamed: {i}"
+        candidate, n = name, 0
+        while candidate in seen:
+            n += 1
+            candidate = f"{name}.{n}"
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+
+def read_sales_table(source, names, usecols, sales_col, cat_col=None, block_size=8 << 20):
+    """Parse only the mapped columns with Arrow's multi-threaded CSV reader."""
+    # Sales fit comfortably in float32; categories arrive as integer codes plus a dictionary
+    column_types = {sales_col: pa.float32()}
+    if cat_col is not None:
+        column_types[cat_col] = pa.dictionary(pa.int32(), pa.string())
+    try:
+        table = pacsv.read_csv(
+            source,
+            # Supply the de-duplicated header ourselves so names match the column pickers
+            read_options=pacsv.ReadOptions(encoding="latin1", block_size=block_size,
+                                           column_names=names, skip_rows=1),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=usecols,
+                column_types=column_types,
+                # Let Arrow type the date column itself; anything else falls back to pd.to_datetime
+                timestamp_parsers=[pacsv.ISO8601, "%m/%d/%Y"],
+            ),
+        )
+    except pa.ArrowInvalid:
+        # Arrow rejects rows with missing fields; pandas pads them with NaN, so retry with it
+        source.seek(0)
+        table = read_sales_table_pandas(source, names, usecols, sales_col, cat_col)
+    # Each parsed block gets its own dictionary; share one so codes agree across chunks
+    return table.unify_dictionaries() if cat_col is not None else table
+
+
+def read_sales_table_pandas(source, names, usecols, sales_col, cat_col=None):
+    """Slower fallback for ragged CSVs, returning the same column types as the Arrow reader."""
+    df = pd.read_csv(source, encoding="latin1", header=0, names=names, usecols=usecols,
+                     dtype={sales_col: "float32"})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if cat_col is not None:
+        i = table.schema.get_field_index(cat_col)
+        table = table.set_column(i, cat_col, pc.dictionary_encode(table[cat_col].cast(pa.string())))
+    return table
+
+
+def list_categories(table, cat_col):
+    """Distinct categories read from the column's dictionary, O(#categories) not O(#rows)."""
+    column = table[cat_col]
+    if not pa.types.is_dictionary(column.type):
+        return pc.unique(column).drop_null().to_pylist()
+    if column.num_chunks == 0:
+        return []
+    return column.chunk(0).dictionary.to_pylist()
+
+
+def filter_categories(table, cat_col, selected_cat):
+    """Keep rows whose category is selected, evaluated in Arrow before any pandas copy."""
+    column = table[cat_col]
+    if not pa.types.is_dictionary(column.type):
+        value_set = pa.array(selected_cat, type=column.type)
+        return table.filter(pc.is_in(column, value_set=value_set))
+    if column.num_chunks == 0:
+        return table
+
+    # Match the selection against the shared dictionary once, then gather by code
+    value_set = pa.array(selected_cat, type=column.type.value_type)
+    selected_codes = pc.is_in(column.chunk(0).dictionary, value_set=value_set)
+    mask = pa.chunked_array([pc.take(selected_codes, chunk.indices) for chunk in column.chunks],
+                            type=pa.bool_())
+    return table.filter(mask)
+
+
+def is_datetime_column(series):
+    """True if the column already holds timestamps (NumPy or Arrow backed)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    return isinstance(series.dtype, pd.ArrowDtype) and series.dtype.kind == "M"
@@ -0,0 +1,19 @@
+"""Forecast accuracy metrics, compiled once per process rather than on every Streamlit rerun."""
+import numpy as np
+from numba import njit, types
+
+# Read-only so views returned by pandas under copy-on-write are accepted without a copy
+READONLY_F64 = types.Array(types.float64, 1, "C", readonly=True)
+
+
+@njit(types.float64(READONLY_F64, READONLY_F64), cache=True, fastmath=True)
+def mape_pct(actual, predicted):
+    """MAPE in percent over non-zero actuals, fused into a single pass; NaN if all are zero."""
+    total = 0.0
+    n = 0
+    for i in range(actual.size):
+        a = actual[i]
+        if a != 0.0:
+            total += abs((a - predicted[i]) / a)
+            n += 1
+    return 100.0 * total / n if n else np.nan
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The app's helper modules sit at the repository root, next to app.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
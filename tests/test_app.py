@@ -0,0 +1,62 @@
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def upload(at, name, data):
+    at.file_uploader[0].set_value((name, data, "text/csv"))
+    return at.run()
+
+
+def test_app_runs_on_superstore():
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=300)
+    at.run()
+    upload(at, "Superstore.csv", (ROOT / "Superstore.csv").read_bytes())
+    assert not at.exception
+    assert len(at.metric) == 3
+
+    at.sidebar.selectbox[2].set_value("Category").run()
+    assert not at.exception
+
+    at.sidebar.multiselect[0].set_value(["Furniture"]).run()
+    assert not at.exception
+
+    for tab in at.tabs:
+        at.session_state["view"] = tab.label
+        at.run()
+        assert not at.exception
+    assert len(at.download_button) == 1
+
+
+def test_blank_and_duplicate_headers_are_selectable():
+    header, *rows = (ROOT / "Superstore.csv").read_bytes().decode("latin1").splitlines()
+    header = header.replace("Ship Mode", "").replace("Profit", "Sales")
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=300)
+    at.run()
+    upload(at, "renamed.csv", "\n".join([header, *rows]).encode("latin1"))
+
+    assert "Unnamed: 4" in at.sidebar.selectbox[0].options
+    at.sidebar.selectbox[1].set_value("Sales.1").run()
+    at.sidebar.selectbox[2].set_value("Unnamed: 4").run()
+    assert not at.exception
+
+
+def test_short_rows_are_padded_like_pandas():
+    rows = [f"2020-{m:02d}-01,{m * 10},x" if m % 2 else f"2020-{m:02d}-01,{m * 10}" for m in range(1, 13)]
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=300)
+    at.run()
+    upload(at, "short.csv", "\n".join(["Date,Sales,Extra", *rows]).encode("latin1"))
+    assert not at.exception
+    assert not at.error
+    assert at.metric[0].value == "$65"
+
+
+def test_unparseable_sales_column_shows_an_error():
+    rows = [f"2020-{m:02d}-01,n/a{m}" for m in range(1, 13)]
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=300)
+    at.run()
+    upload(at, "bad.csv", "\n".join(["Date,Sales", *rows]).encode("latin1"))
+    assert not at.exception
+    assert at.error
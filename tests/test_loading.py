@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from loading import filter_categories, list_categories, read_header, read_sales_table
+
+SUPERSTORE = Path(__file__).resolve().parents[1] / "Superstore.csv"
+
+
+def read_superstore(block_size):
+    data = pa.py_buffer(SUPERSTORE.read_bytes())
+    names = read_header(pa.BufferReader(data))
+    return read_sales_table(pa.BufferReader(data), names, ["Order Date", "Sales", "Category"],
+                            "Sales", "Category", block_size=block_size)
+
+
+def test_list_categories_from_unified_dictionary():
+    table = read_superstore(block_size=64 << 10)
+    assert table["Category"].num_chunks > 1
+
+    expected = pd.read_csv(SUPERSTORE, encoding="latin1")["Category"].unique().tolist()
+    assert sorted(list_categories(table, "Category")) == sorted(expected)
+    # Every chunk shares the dictionary read from chunk(0)
+    assert all(chunk.dictionary.equals(table["Category"].chunk(0).dictionary)
+               for chunk in table["Category"].chunks)
+
+
+def test_filter_categories_across_chunks():
+    table = read_superstore(block_size=64 << 10)
+    assert table["Category"].num_chunks > 1
+
+    expected = pd.read_csv(SUPERSTORE, encoding="latin1")["Category"].isin(["Furniture", "Technology"]).sum()
+    filtered = filter_categories(table, "Category", ["Furniture", "Technology"])
+    assert filtered.num_rows == expected
+    assert set(filtered["Category"].to_pylist()) == {"Furniture", "Technology"}
@@ -0,0 +1,27 @@
+import math
+
+import numpy as np
+
+from metrics import mape_pct
+
+
+def test_mape_pct():
+    actual = np.array([100.0, 200.0, 400.0])
+    predicted = np.array([110.0, 180.0, 400.0])
+    assert math.isclose(mape_pct(actual, predicted), 100.0 * (0.1 + 0.1 + 0.0) / 3)
+
+
+def test_mape_pct_skips_zero_actuals():
+    actual = np.array([0.0, 100.0, 0.0, 200.0])
+    predicted = np.array([50.0, 150.0, -5.0, 100.0])
+    assert math.isclose(mape_pct(actual, predicted), 50.0)
+
+
+def test_mape_pct_all_zero_actuals_is_nan():
+    assert math.isnan(mape_pct(np.zeros(4), np.ones(4)))
+
+
+def test_mape_pct_accepts_read_only_arrays():
+    actual = np.array([100.0, 200.0])
+    actual.flags.writeable = False
+    assert math.isclose(mape_pct(actual, np.array([100.0, 100.0])), 25.0)